@@ -0,0 +1,113 @@
+import asyncio
+
+from metrics import timed_query
+
+
+def apply_batch(conn, operations):
+    # One transaction for the whole batch; each operation gets its own
+    # savepoint so a failing statement does not take its neighbours down.
+    results = []
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for func, args in operations:
+            conn.execute("SAVEPOINT op")
+            try:
+                result = timed_query(func, conn, *args)
+            except Exception as exc:
+                conn.execute("ROLLBACK TO op")
+                conn.execute("RELEASE op")
+                results.append((False, exc))
+            else:
+                conn.execute("RELEASE op")
+                results.append((True, result))
+        conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    return results
+
+
+class WriteBatcher:
+    """Group-commit queue for database writes.
+
+    Writes submitted from handlers are collected and applied together in a
+    single transaction (one fsync) once ``max_batch`` operations are queued
+    or ``max_delay`` seconds have passed since the first one, whichever comes
+    first. ``submit()`` returns a future that resolves after the commit.
+    """
+
+    def __init__(self, write, max_batch=64, max_delay=0.005):
+        self._write = write
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.operations = 0
+        self.transactions = 0
+        self._queue = asyncio.Queue()
+        self._task = None
+        self._closed = False
+
+    def submit(self, func, *args):
+        if self._closed:
+            raise RuntimeError("WriteBatcher is closed")
+        loop = asyncio.get_running_loop()
+        if self._task is None:
+            self._task = loop.create_task(self._run())
+        future = loop.create_future()
+        self._queue.put_nowait((func, args, future))
+        return future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                if self._queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = self._queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        try:
+            results = await self._write(apply_batch, [(func, args) for func, args, _ in batch])
+        except Exception as exc:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        self.operations += len(batch)
+        self.transactions += 1
+        for (_, _, future), (ok, value) in zip(batch, results):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    async def close(self):
+        """Stop accepting writes and wait until everything queued is committed."""
+        self._closed = True
+        if self._task is not None:
+            self._queue.put_nowait(None)
+            await self._task
+            self._task = None
+
+    def stats(self):
+        return {"operations": self.operations, "transactions": self.transactions}
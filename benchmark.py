@@ -0,0 +1,279 @@
+"""Load test for the bot handlers.
+
+Drives start, addtask, viewtasks, taskhistory and button_callback from
+handlers.py with synthetic updates against a fake in-process Bot, on a
+pre-populated database, and reports latency percentiles, throughput,
+SQLite queries per update and Bot API calls per update.
+
+    python benchmark.py --users 1000 --tasks-per-user 100 --updates 20000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from types import SimpleNamespace
+
+from telegram import Update
+
+from database import TaskRepository, init_db
+from dispatch import per_user
+from handlers import addtask, button_callback, start, taskhistory, viewtasks
+from metrics import instrument
+
+QUERY_PREFIXES = ("SELECT", "INSERT", "UPDATE", "DELETE")
+
+
+class FakeBot:
+    """Stands in for telegram.Bot and records API calls instead of sending them."""
+
+    defaults = None
+
+    def __init__(self):
+        self.calls = Counter()
+        self._message_id = 0
+
+    def _message(self, chat_id, text):
+        self._message_id += 1
+        return {"message_id": self._message_id, "date": 0, "chat": {"id": chat_id, "type": "private"}, "text": text}
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.calls["sendMessage"] += 1
+        return self._message(chat_id, text)
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        self.calls["editMessageText"] += 1
+        return self._message(chat_id, text)
+
+    async def answer_callback_query(self, callback_query_id, **kwargs):
+        self.calls["answerCallbackQuery"] += 1
+        return True
+
+
+class CountingCursor(sqlite3.Cursor):
+    def execute(self, sql, *args):
+        self.connection.count(sql)
+        return super().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        self.connection.count(sql)
+        return super().executemany(sql, *args)
+
+
+class CountingConnection(sqlite3.Connection):
+    """Connection that reports every statement handed to it by the caller.
+
+    Counting happens where database.py issues statements, so trigger programs
+    (the FTS index upkeep) and SQLite's own internal statements are not
+    counted, and an executemany() counts once.
+    """
+
+    on_statement = None
+
+    def cursor(self, factory=CountingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, *args):
+        self.count(sql)
+        return super().execute(sql, *args)
+
+    def count(self, sql):
+        if self.on_statement is not None:
+            self.on_statement(sql)
+
+
+class CountingRepository(TaskRepository):
+    """TaskRepository that counts the SQL queries run on its connections."""
+
+    connection_factory = CountingConnection
+
+    def __init__(self, *args, **kwargs):
+        self.queries = 0
+        self._queries_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def _open_connection(self):
+        super()._open_connection()
+        self._local.conn.on_statement = self._count
+
+    def _count(self, statement):
+        # Transaction control (BEGIN, SAVEPOINT, COMMIT, ...) is not a query
+        if statement.lstrip().upper().startswith(QUERY_PREFIXES):
+            with self._queries_lock:
+                self.queries += 1
+
+
+def populate(path, users, tasks_per_user):
+    conn = sqlite3.connect(path, isolation_level=None)
+    init_db(conn)
+    conn.execute("BEGIN")
+    statuses = ("pending", "pending", "completed", "removed")
+    conn.executemany(
+        "INSERT INTO tasks (user_id, task, status) VALUES (?, ?, ?)",
+        (
+            (user_id, f"Task {n} of user {user_id}", statuses[n % len(statuses)])
+            for user_id in range(1, users + 1)
+            for n in range(tasks_per_user)
+        ),
+    )
+    conn.execute("COMMIT")
+    conn.close()
+
+
+def load_task_ids(path):
+    """Return ``{user_id: [task ids]}`` for every user in the database."""
+    conn = sqlite3.connect(path)
+    task_ids = defaultdict(list)
+    for user_id, task_id in conn.execute("SELECT user_id, id FROM tasks ORDER BY user_id, id"):
+        task_ids[user_id].append(task_id)
+    conn.close()
+    return dict(task_ids)
+
+
+class UpdateFactory:
+    def __init__(self, bot, task_ids, rng):
+        self.bot = bot
+        self.task_ids = task_ids
+        self.users = sorted(task_ids)
+        self.rng = rng
+        self._update_id = 0
+
+    def _user(self, user_id):
+        return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+
+    def _message(self, user_id, text):
+        return {
+            "message_id": self._update_id,
+            "date": 0,
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id),
+            "text": text,
+        }
+
+    def command(self, user_id, text):
+        self._update_id += 1
+        return Update.de_json({"update_id": self._update_id, "message": self._message(user_id, text)}, self.bot)
+
+    def callback(self, user_id, data):
+        self._update_id += 1
+        return Update.de_json(
+            {
+                "update_id": self._update_id,
+                "callback_query": {
+                    "id": str(self._update_id),
+                    "from": self._user(user_id),
+                    "chat_instance": str(user_id),
+                    "data": data,
+                    "message": self._message(user_id, "menu"),
+                },
+            },
+            self.bot,
+        )
+
+    def task_id(self, user_id):
+        return self.rng.choice(self.task_ids[user_id])
+
+    def random(self):
+        """Return ``(name, handler, update, args)`` for one synthetic interaction."""
+        user_id = self.rng.choice(self.users)
+        kind = self.rng.choices(
+            ("start", "addtask", "viewtasks", "taskhistory", "back", "page", "complete", "restore"),
+            weights=(10, 10, 15, 10, 20, 15, 10, 10),
+        )[0]
+        if kind == "start":
+            return kind, start, self.command(user_id, "/start"), []
+        if kind == "addtask":
+            return kind, addtask, self.command(user_id, "/addtask benchmark task"), ["benchmark", "task"]
+        if kind == "viewtasks":
+            return kind, viewtasks, self.command(user_id, "/viewtasks"), []
+        if kind == "taskhistory":
+            return kind, taskhistory, self.command(user_id, "/taskhistory"), []
+        if kind == "back":
+            data = "back"
+        elif kind == "page":
+            data = f"page_pending_a_{self.task_id(user_id)}"
+        elif kind == "complete":
+            data = f"complete_{self.task_id(user_id)}"
+        else:
+            data = f"restore_completed_{self.task_id(user_id)}"
+        return kind, button_callback, self.callback(user_id, data), []
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run(args, path):
+    if not os.path.exists(path):
+        print(f"Populating {path} with {args.users} users x {args.tasks_per_user} tasks...")
+        populate(path, args.users, args.tasks_per_user)
+
+    repo = CountingRepository(path, readers=args.readers)
+    await repo.init()
+    # Task ids come from the database, so an existing --db file works as-is
+    task_ids = load_task_ids(path)
+    if not task_ids:
+        raise SystemExit(f"{path} has no tasks to benchmark against")
+    bot = FakeBot()
+    factory = UpdateFactory(bot, task_ids, random.Random(args.seed))
+    workload = [factory.random() for _ in range(args.updates)]
+    latencies = defaultdict(list)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def handle(name, handler, update, handler_args):
+        context = SimpleNamespace(args=handler_args, bot=bot, bot_data={"repo": repo})
+        async with semaphore:
+            began = time.perf_counter()
+            await instrument(per_user(handler))(update, context)
+            latencies[name].append(time.perf_counter() - began)
+
+    queries_before = repo.queries
+    began = time.perf_counter()
+    await asyncio.gather(*(handle(*item) for item in workload))
+    elapsed = time.perf_counter() - began
+    queries = repo.queries - queries_before
+    await repo.close()
+
+    everything = sorted(value for values in latencies.values() for value in values)
+    print(f"\n{args.updates} updates in {elapsed:.2f}s: {args.updates / elapsed:,.0f} updates/sec "
+          f"(concurrency {args.concurrency})")
+    print(f"{'handler':<12}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, values in sorted(latencies.items()) + [("all", everything)]:
+        values = sorted(values)
+        print(f"{name:<12}{len(values):>8}"
+              f"{percentile(values, 0.50) * 1000:>10.2f}"
+              f"{percentile(values, 0.95) * 1000:>10.2f}"
+              f"{percentile(values, 0.99) * 1000:>10.2f}")
+    api_calls = sum(bot.calls.values())
+    print(f"\nSQLite queries per update: {queries / args.updates:.2f}")
+    print(f"API calls per update:      {api_calls / args.updates:.2f} {dict(bot.calls)}")
+    print(f"Cache:                     {repo.cache.stats()}")
+    print(f"Write batcher:             {repo.batcher.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--tasks-per-user", type=int, default=50)
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", help="Database file to use (created and populated if missing, kept afterwards)")
+    args = parser.parse_args()
+    if args.db is not None:
+        asyncio.run(run(args, args.db))
+    else:
+        with tempfile.TemporaryDirectory(prefix="taskbot-bench-") as directory:
+            asyncio.run(run(args, os.path.join(directory, "tasks.db")))
+
+
+if __name__ == "__main__":
+    main()
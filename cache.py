@@ -0,0 +1,82 @@
+import time
+from collections import OrderedDict
+
+
+class TaskCache:
+    """Bounded per-user cache of task query results.
+
+    Entries are grouped by user so any write for a user drops everything
+    cached for them. Users are evicted least-recently-used first once
+    ``max_users`` is exceeded, each user keeps at most ``max_entries``
+    entries (oldest dropped first), and entries expire after ``ttl`` seconds.
+    """
+
+    def __init__(self, max_users=1024, ttl=300.0, max_entries=16):
+        self.max_users = max_users
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._users = OrderedDict()
+        # Epoch of each user's latest invalidation, so a read that raced a
+        # write for that user does not store its (possibly stale) result.
+        # Old entries are trimmed; trimmed users fall back to _floor.
+        self._epoch = 0
+        self._invalidated = {}
+        self._floor = 0
+
+    def token(self):
+        return self._epoch
+
+    def get(self, user_id, key):
+        entries = self._users.get(user_id)
+        if entries is not None:
+            entry = entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > time.monotonic():
+                    self._users.move_to_end(user_id)
+                    # Keep each user's entries in least-recently-used order too
+                    entries[key] = entries.pop(key)
+                    self.hits += 1
+                    return value
+                del entries[key]
+        self.misses += 1
+        return None
+
+    def set(self, user_id, key, value, token):
+        if self.max_users <= 0 or self._invalidated.get(user_id, self._floor) > token:
+            return
+        now = time.monotonic()
+        entries = self._users.get(user_id)
+        if entries is None:
+            entries = self._users[user_id] = {}
+        else:
+            self._users.move_to_end(user_id)
+            entries.pop(key, None)
+            if len(entries) >= self.max_entries:
+                for old_key in [k for k, (_, expires) in entries.items() if expires <= now]:
+                    del entries[old_key]
+                while len(entries) >= self.max_entries:
+                    del entries[next(iter(entries))]
+        entries[key] = (value, now + self.ttl)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+
+    def invalidate(self, user_id):
+        self._epoch += 1
+        self._users.pop(user_id, None)
+        self._invalidated.pop(user_id, None)
+        self._invalidated[user_id] = self._epoch
+        if len(self._invalidated) > 4 * max(self.max_users, 1):
+            for _ in range(len(self._invalidated) // 2):
+                self._floor = self._invalidated.pop(next(iter(self._invalidated)))
+
+    def clear(self):
+        self._epoch += 1
+        self._floor = self._epoch
+        self._invalidated.clear()
+        self._users.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "users": len(self._users)}
@@ -1,44 +1,290 @@
+import asyncio
+import logging
+import re
 import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-def init_db():
-    conn = sqlite3.connect("tasks.db")
-    c = conn.cursor()
+from batcher import WriteBatcher
+from cache import TaskCache
+from metrics import timed_query
+
+DB_PATH = "tasks.db"
+
+logger = logging.getLogger(__name__)
+
+
+def _connect(path, factory=sqlite3.Connection):
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, factory=factory)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+def _migration_1(c):
     c.execute('''CREATE TABLE IF NOT EXISTS tasks (
         user_id INTEGER,
         task TEXT,
         status TEXT
     )''')
-    conn.commit()
-    conn.close()
 
-def add_task(user_id, task, status="pending"):
-    conn = sqlite3.connect("tasks.db")
+def _migration_2(c):
+    # Rebuild with an explicit primary key; existing rowids become ids so
+    # callback data already sent to users keeps pointing at the same task.
+    # AUTOINCREMENT keeps ids of deleted tasks from being handed out again.
+    c.execute('''CREATE TABLE tasks_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        task TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )''')
+    c.execute("INSERT INTO tasks_new (id, user_id, task, status) SELECT rowid, user_id, task, status FROM tasks")
+    c.execute("DROP TABLE tasks")
+    c.execute("ALTER TABLE tasks_new RENAME TO tasks")
+    c.execute("CREATE INDEX idx_tasks_user_status_id ON tasks (user_id, status, id)")
+
+def _migration_3(c):
+    # Full-text index over task text. It is an external-content table (the
+    # text lives only in tasks) kept in sync by triggers; user_id is indexed
+    # too so a search only intersects with that user's documents.
+    c.execute("CREATE VIRTUAL TABLE tasks_fts USING fts5(task, user_id, content='tasks', content_rowid='id')")
+    c.execute('''CREATE TRIGGER tasks_fts_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts (rowid, task, user_id) VALUES (new.id, new.task, new.user_id);
+    END''')
+    c.execute('''CREATE TRIGGER tasks_fts_delete AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, task, user_id) VALUES ('delete', old.id, old.task, old.user_id);
+    END''')
+    c.execute('''CREATE TRIGGER tasks_fts_update AFTER UPDATE OF task, user_id ON tasks BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, task, user_id) VALUES ('delete', old.id, old.task, old.user_id);
+        INSERT INTO tasks_fts (rowid, task, user_id) VALUES (new.id, new.task, new.user_id);
+    END''')
+    c.execute("INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')")
+
+# Applied in order; the schema version is the number of migrations applied.
+MIGRATIONS = [
+    _migration_1,
+    _migration_2,
+    _migration_3,
+]
+
+def init_db(conn):
+    c = conn.cursor()
+    version = c.execute("PRAGMA user_version").fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        c.execute("BEGIN")
+        try:
+            migration(c)
+            c.execute(f"PRAGMA user_version = {number}")
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+
+def add_task(conn, user_id, task, status="pending"):
     c = conn.cursor()
     c.execute("INSERT INTO tasks (user_id, task, status) VALUES (?, ?, ?)", (user_id, task, status))
-    conn.commit()
-    conn.close()
+    return c.rowcount
 
-def get_tasks(user_id, status=None):
-    conn = sqlite3.connect("tasks.db")
+def add_tasks(conn, user_id, tasks, status="pending"):
     c = conn.cursor()
-    if status:
-        c.execute("SELECT rowid, task FROM tasks WHERE user_id = ? AND status = ?", (user_id, status))
-    else:
-        c.execute("SELECT rowid, task, status FROM tasks WHERE user_id = ?", (user_id,))
-    tasks = c.fetchall()
-    conn.close()
-    return tasks
+    c.executemany(
+        "INSERT INTO tasks (user_id, task, status) VALUES (?, ?, ?)",
+        [(user_id, task, status) for task in tasks],
+    )
+    return c.rowcount
 
-def update_task_status(rowid, status):
-    conn = sqlite3.connect("tasks.db")
+def has_tasks(conn, user_id, status):
     c = conn.cursor()
-    c.execute("UPDATE tasks SET status = ? WHERE rowid = ?", (status, rowid))
-    conn.commit()
-    conn.close()
+    c.execute("SELECT 1 FROM tasks WHERE user_id = ? AND status = ? LIMIT 1", (user_id, status))
+    return c.fetchone() is not None
 
-def delete_task(rowid):
-    conn = sqlite3.connect("tasks.db")
+def get_tasks_page(conn, user_id, statuses, after_id=None, before_id=None, limit=10):
+    # Keyset pagination: each status is an index range scan on
+    # (user_id, status, id) that stops after limit + 1 rows, so the cost of a
+    # page does not depend on how many tasks the user has.
     c = conn.cursor()
-    c.execute("DELETE FROM tasks WHERE rowid = ?", (rowid,))
-    conn.commit()
-    conn.close()
+    rows = []
+    for status in statuses:
+        if before_id is not None:
+            c.execute(
+                "SELECT id, task, status FROM tasks WHERE user_id = ? AND status = ? AND id < ? "
+                "ORDER BY id DESC LIMIT ?",
+                (user_id, status, before_id, limit + 1),
+            )
+        else:
+            c.execute(
+                "SELECT id, task, status FROM tasks WHERE user_id = ? AND status = ? AND id > ? "
+                "ORDER BY id LIMIT ?",
+                (user_id, status, after_id or 0, limit + 1),
+            )
+        rows.extend(c.fetchall())
+    rows.sort(reverse=before_id is not None)
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if before_id is not None:
+        rows.reverse()
+        return rows, more, True
+    return rows, after_id is not None, more
+
+def update_task_status(conn, user_id, task_id, status):
+    c = conn.cursor()
+    c.execute(
+        "UPDATE tasks SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ? AND user_id = ?",
+        (status, task_id, user_id),
+    )
+    return c.rowcount
+
+def complete_all_tasks(conn, user_id):
+    c = conn.cursor()
+    c.execute(
+        "UPDATE tasks SET status = 'completed', updated_at = CURRENT_TIMESTAMP "
+        "WHERE user_id = ? AND status = 'pending'",
+        (user_id,),
+    )
+    return c.rowcount
+
+def clear_history(conn, user_id):
+    c = conn.cursor()
+    c.execute("DELETE FROM tasks WHERE user_id = ? AND status IN ('completed', 'removed')", (user_id,))
+    return c.rowcount
+
+def search_tasks(conn, user_id, text, limit=10):
+    # Every word of the query must match, as a prefix, within the user's tasks
+    terms = re.findall(r"\w+", text)
+    if not terms:
+        return []
+    match = " AND ".join([f'user_id:"{user_id}"'] + [f'task:"{term}"*' for term in terms])
+    c = conn.cursor()
+    c.execute(
+        "SELECT t.id, t.task, t.status FROM tasks_fts JOIN tasks t ON t.id = tasks_fts.rowid "
+        "WHERE tasks_fts MATCH ? AND t.user_id = ? ORDER BY tasks_fts.rank LIMIT ?",
+        (match, user_id, limit),
+    )
+    return c.fetchall()
+
+def delete_task(conn, user_id, task_id):
+    c = conn.cursor()
+    c.execute("DELETE FROM tasks WHERE id = ? AND user_id = ?", (task_id, user_id))
+    return c.rowcount
+
+
+class TaskRepository:
+    """Async access to the tasks database.
+
+    SQLite calls run on dedicated threads so they never block the event loop:
+    a single writer thread owns the only write connection, and a small pool of
+    reader threads each hold their own long-lived connection (WAL mode lets
+    readers proceed while a write is in flight). Read results are cached per
+    user and dropped whenever that user's tasks change. Writes are grouped
+    into shared transactions by a WriteBatcher.
+    """
+
+    connection_factory = sqlite3.Connection
+
+    def __init__(self, path=DB_PATH, readers=4, cache_size=1024, cache_ttl=300.0,
+                 batch_size=64, batch_delay=0.005):
+        self.path = path
+        self.cache = TaskCache(max_users=cache_size, ttl=cache_ttl)
+        self.batcher = WriteBatcher(self._write, max_batch=batch_size, max_delay=batch_delay)
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="db-writer", initializer=self._open_connection
+        )
+        self._readers = ThreadPoolExecutor(
+            max_workers=readers, thread_name_prefix="db-reader", initializer=self._open_connection
+        )
+
+    def _open_connection(self):
+        conn = _connect(self.path, self.connection_factory)
+        self._local.conn = conn
+        with self._connections_lock:
+            self._connections.append(conn)
+
+    def _call(self, func, *args):
+        return timed_query(func, self._local.conn, *args)
+
+    async def _write(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, self._call, func, *args)
+
+    async def _read(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, self._call, func, *args)
+
+    async def init(self):
+        await self._write(init_db)
+
+    async def _cached_read(self, user_id, key, func, *args):
+        result = self.cache.get(user_id, key)
+        if result is None:
+            token = self.cache.token()
+            result = await self._read(func, *args)
+            self.cache.set(user_id, key, result, token)
+        return result
+
+    async def _user_write(self, user_id, func, *args, wait=True):
+        # With wait=False the write is only queued; it becomes durable (and
+        # visible to reads) when its batch commits a few milliseconds later.
+        self.cache.invalidate(user_id)
+        future = self.batcher.submit(func, user_id, *args)
+        future.add_done_callback(lambda f: self._write_done(user_id, f, wait))
+        if wait:
+            return await future
+
+    def _write_done(self, user_id, future, waited):
+        self.cache.invalidate(user_id)
+        if not waited and not future.cancelled() and future.exception() is not None:
+            logger.error("Write for user %s failed", user_id, exc_info=future.exception())
+
+    async def add_task(self, user_id, task, status="pending", wait=True):
+        await self._user_write(user_id, add_task, task, status, wait=wait)
+
+    async def add_tasks(self, user_id, tasks, status="pending", wait=True):
+        """Insert several tasks with one executemany; returns how many were added."""
+        return await self._user_write(user_id, add_tasks, list(tasks), status, wait=wait)
+
+    async def has_tasks(self, user_id, status):
+        return await self._cached_read(user_id, ("has", status), has_tasks, user_id, status)
+
+    async def get_tasks_page(self, user_id, statuses, after_id=None, before_id=None, limit=10):
+        """Return ``(rows, has_prev, has_next)`` for one page of ``(id, task, status)`` rows."""
+        statuses = tuple(statuses)
+        return await self._cached_read(
+            user_id,
+            ("page", statuses, after_id, before_id, limit),
+            get_tasks_page, user_id, statuses, after_id, before_id, limit,
+        )
+
+    async def update_task_status(self, user_id, task_id, status, wait=True):
+        """Returns the number of rows changed (0 if the task is gone or not the user's)."""
+        return await self._user_write(user_id, update_task_status, task_id, status, wait=wait)
+
+    async def delete_task(self, user_id, task_id, wait=True):
+        return await self._user_write(user_id, delete_task, task_id, wait=wait)
+
+    async def complete_all_tasks(self, user_id):
+        return await self._user_write(user_id, complete_all_tasks)
+
+    async def clear_history(self, user_id):
+        return await self._user_write(user_id, clear_history)
+
+    async def search_tasks(self, user_id, text, limit=10):
+        return await self._read(search_tasks, user_id, text, limit)
+
+    async def close(self):
+        # Drain queued writes before the writer thread goes away
+        await self.batcher.close()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._shutdown)
+
+    def _shutdown(self):
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
@@ -0,0 +1,48 @@
+import asyncio
+import functools
+
+
+class UserLocks:
+    """One asyncio.Lock per user that is currently being served.
+
+    Locks are reference counted and dropped once no update for that user is
+    running or waiting, so the table only holds active users.
+    """
+
+    def __init__(self):
+        self._locks = {}
+
+    @property
+    def active(self):
+        return len(self._locks)
+
+    async def run(self, user_id, coro_func, *args):
+        entry = self._locks.get(user_id)
+        if entry is None:
+            entry = self._locks[user_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                return await coro_func(*args)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[user_id]
+
+
+user_locks = UserLocks()
+
+
+def per_user(handler):
+    """Serialize a handler per user while other users' updates run concurrently.
+
+    With concurrent update processing two taps by the same user (say
+    complete_ then restore_ on one task) could otherwise interleave.
+    """
+    @functools.wraps(handler)
+    async def wrapper(update, context):
+        user = update.effective_user
+        if user is None:
+            return await handler(update, context)
+        return await user_locks.run(user.id, handler, update, context)
+    return wrapper
@@ -1,12 +1,15 @@
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import CallbackContext
-from database import add_task, get_tasks, update_task_status
-from keyboards import get_main_menu_keyboard
+from keyboards import get_main_menu_keyboard, get_pagination_row
 from messages import WELCOME_MESSAGE
+from metrics import metrics
+
+PAGE_SIZE = 10
+TASK_GONE_NOTICE = "⚠️ That task no longer exists."
 
 async def start(update: Update, context: CallbackContext):
     user_id = update.message.from_user.id
-    keyboard = get_main_menu_keyboard(user_id)
+    keyboard = await get_main_menu_keyboard(context.bot_data["repo"], user_id)
     reply_markup = InlineKeyboardMarkup(keyboard)
     await update.message.reply_text(
         WELCOME_MESSAGE,
@@ -24,6 +27,12 @@ async def button_callback(update: Update, context: CallbackContext):
         await viewtasks(query, context, is_callback=True)
     elif query.data == 'back':
         await start_callback(query, context)
+    elif query.data == 'completeall':
+        await completealltasks(query, context)
+    elif query.data == 'clearhistory':
+        await clearhistory(query, context)
+    elif query.data == 'clearhistory_confirm':
+        await clearhistory(query, context, confirmed=True)
     elif query.data.startswith('complete_'):
         task_index = int(query.data.split('_')[1])
         await completetask(query, context, task_index)
@@ -34,51 +43,75 @@ async def button_callback(update: Update, context: CallbackContext):
         task_type, task_index = query.data.split('_')[1:]
         task_index = int(task_index)
         await restoretask(query, context, task_type, task_index)
+    elif query.data.startswith('page_'):
+        view, direction, cursor = query.data.split('_')[1:]
+        cursor = int(cursor)
+        after_id = cursor if direction == 'a' else None
+        before_id = cursor if direction == 'b' else None
+        if view == 'pending':
+            await viewtasks(query, context, is_callback=True, after_id=after_id, before_id=before_id)
+        elif view == 'history':
+            await taskhistory(query, context, is_callback=True, after_id=after_id, before_id=before_id)
     elif query.data == 'history':
         await taskhistory(query, context, is_callback=True)
     elif query.data == 'help':
         await help_command(query, context, is_callback=True)
 
-async def start_callback(query, context):
+async def start_callback(query, context, notice=None):
     user_id = query.from_user.id
-    keyboard = get_main_menu_keyboard(user_id)
+    keyboard = await get_main_menu_keyboard(context.bot_data["repo"], user_id)
     reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_text(
-        WELCOME_MESSAGE,
+        f"{WELCOME_MESSAGE}\n\n{notice}" if notice else WELCOME_MESSAGE,
         reply_markup=reply_markup,
         disable_web_page_preview=True
     )
 
 async def addtask(update: Update, context: CallbackContext):
     user_id = update.message.from_user.id
-    task_name = ' '.join(context.args)
-    if task_name:
-        add_task(user_id, task_name)
-        await update.message.reply_text(f"✅ Task '{task_name}' added successfully.")
-        
+    # Each non-empty line after the command is a task (context.args loses the line breaks)
+    parts = (update.message.text or '').split(None, 1)
+    task_names = [line.strip() for line in parts[1].splitlines() if line.strip()] if len(parts) > 1 else []
+    if task_names:
+        if len(task_names) == 1:
+            await context.bot_data["repo"].add_task(user_id, task_names[0])
+            notice = f"✅ Task '{task_names[0]}' added successfully."
+        else:
+            added = await context.bot_data["repo"].add_tasks(user_id, task_names)
+            notice = f"✅ {added} tasks added successfully."
         keyboard = [
             [InlineKeyboardButton("🔙 Back to Menu", callback_data='back')]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await update.message.reply_text(
-            f"{WELCOME_MESSAGE}\n\nTask added. What would you like to do next?",
+            f"{WELCOME_MESSAGE}\n\n{notice} What would you like to do next?",
             reply_markup=reply_markup,
             disable_web_page_preview=True
         )
     else:
         await update.message.reply_text("Please provide the task name using /addtask <task_name>")
 
-async def viewtasks(update: Update, context: CallbackContext, is_callback=False):
+async def viewtasks(update: Update, context: CallbackContext, is_callback=False, after_id=None, before_id=None):
     user_id = update.message.from_user.id if not is_callback else update.from_user.id
-    tasks = get_tasks(user_id, status="pending")
+    repo = context.bot_data["repo"]
+    tasks, has_prev, has_next = await repo.get_tasks_page(
+        user_id, ("pending",), after_id=after_id, before_id=before_id, limit=PAGE_SIZE
+    )
+    if not tasks and (after_id is not None or before_id is not None):
+        # The page emptied out under us (tasks completed elsewhere); start over.
+        tasks, has_prev, has_next = await repo.get_tasks_page(user_id, ("pending",), limit=PAGE_SIZE)
     if tasks:
         buttons = []
-        for idx, (rowid, task) in enumerate(tasks):
+        for idx, (rowid, task, _) in enumerate(tasks):
             task_button = InlineKeyboardButton(f"{idx + 1}. {task}", callback_data=f"task_{rowid}")
             complete_button = InlineKeyboardButton("✅ Complete", callback_data=f"complete_{rowid}")
             remove_button = InlineKeyboardButton("❌ Remove", callback_data=f"remove_{rowid}")
             buttons.append([task_button])
             buttons.append([complete_button, remove_button])
+        pagination = get_pagination_row("pending", tasks, has_prev, has_next)
+        if pagination:
+            buttons.append(pagination)
+        buttons.append([InlineKeyboardButton("✅ Complete all", callback_data='completeall')])
         buttons.append([InlineKeyboardButton("🔙 Back to Menu", callback_data='back')])
         reply_markup = InlineKeyboardMarkup(buttons)
         message_text = "📝 Your pending tasks:"
@@ -95,41 +128,63 @@ async def viewtasks(update: Update, context: CallbackContext, is_callback=False)
 
 async def completetask(update: Update, context: CallbackContext, task_index: int):
     user_id = update.from_user.id
-    update_task_status(task_index, "completed")
-    await update.edit_message_text(f"{WELCOME_MESSAGE}\n\n✅ Task marked as completed.", disable_web_page_preview=True)
-    await start_callback(update, context)
+    updated = await context.bot_data["repo"].update_task_status(user_id, task_index, "completed")
+    await start_callback(update, context, notice="✅ Task marked as completed." if updated else TASK_GONE_NOTICE)
 
 async def removetask(update, context: CallbackContext, task_index: int):
     user_id = update.from_user.id
-    update_task_status(task_index, "removed")
-    await update.edit_message_text(f"{WELCOME_MESSAGE}\n\n❌ Task removed.", disable_web_page_preview=True)
-    await start_callback(update, context)
+    updated = await context.bot_data["repo"].update_task_status(user_id, task_index, "removed")
+    await start_callback(update, context, notice="❌ Task removed." if updated else TASK_GONE_NOTICE)
 
 async def restoretask(update, context: CallbackContext, task_type: str, task_index: int):
     user_id = update.from_user.id
     if task_type == 'completed':
-        update_task_status(task_index, "pending")
-        await update.edit_message_text(f"{WELCOME_MESSAGE}\n\n♻️ Task restored to pending.", disable_web_page_preview=True)
-        await start_callback(update, context)
+        updated = await context.bot_data["repo"].update_task_status(user_id, task_index, "pending")
+        await start_callback(update, context, notice="♻️ Task restored to pending." if updated else TASK_GONE_NOTICE)
     elif task_type == 'removed':
-        update_task_status(task_index, "pending")
-        await update.edit_message_text(f"{WELCOME_MESSAGE}\n\n♻️ Task restored to pending.", disable_web_page_preview=True)
-        await start_callback(update, context)
+        updated = await context.bot_data["repo"].update_task_status(user_id, task_index, "pending")
+        await start_callback(update, context, notice="♻️ Task restored to pending." if updated else TASK_GONE_NOTICE)
+
+async def completealltasks(update, context: CallbackContext):
+    user_id = update.from_user.id
+    completed = await context.bot_data["repo"].complete_all_tasks(user_id)
+    await start_callback(update, context, notice=f"✅ {completed} tasks marked as completed.")
 
-async def taskhistory(update, context: CallbackContext, is_callback=False):
+async def clearhistory(update, context: CallbackContext, confirmed=False):
+    user_id = update.from_user.id
+    if not confirmed:
+        buttons = [
+            [InlineKeyboardButton("🗑 Yes, delete it", callback_data='clearhistory_confirm')],
+            [InlineKeyboardButton("🔙 No, keep it", callback_data='history')],
+        ]
+        await update.edit_message_text(
+            f"{WELCOME_MESSAGE}\n\nDelete all completed and removed tasks? This cannot be undone.",
+            reply_markup=InlineKeyboardMarkup(buttons),
+            disable_web_page_preview=True
+        )
+        return
+    deleted = await context.bot_data["repo"].clear_history(user_id)
+    await start_callback(update, context, notice=f"🗑 {deleted} tasks deleted from history.")
+
+async def taskhistory(update, context: CallbackContext, is_callback=False, after_id=None, before_id=None):
     user_id = update.message.from_user.id if not is_callback else update.from_user.id
-    comp_tasks = get_tasks(user_id, status="completed")
-    rem_tasks = get_tasks(user_id, status="removed")
-    if comp_tasks or rem_tasks:
+    repo = context.bot_data["repo"]
+    statuses = ("completed", "removed")
+    tasks, has_prev, has_next = await repo.get_tasks_page(
+        user_id, statuses, after_id=after_id, before_id=before_id, limit=PAGE_SIZE
+    )
+    if not tasks and (after_id is not None or before_id is not None):
+        tasks, has_prev, has_next = await repo.get_tasks_page(user_id, statuses, limit=PAGE_SIZE)
+    if tasks:
         buttons = []
-        if comp_tasks:
-            for idx, (rowid, task) in enumerate(comp_tasks):
-                buttons.append([InlineKeyboardButton(f"✅ {idx + 1}. {task}", callback_data=f"task_completed_{rowid}")])
-                buttons.append([InlineKeyboardButton(f"♻️ Restore '{task}'", callback_data=f"restore_completed_{rowid}")])
-        if rem_tasks:
-            for idx, (rowid, task) in enumerate(rem_tasks):
-                buttons.append([InlineKeyboardButton(f"❌ {idx + 1}. {task}", callback_data=f"task_removed_{rowid}")])
-                buttons.append([InlineKeyboardButton(f"♻️ Restore '{task}'", callback_data=f"restore_removed_{rowid}")])
+        for idx, (rowid, task, status) in enumerate(tasks):
+            icon = "✅" if status == "completed" else "❌"
+            buttons.append([InlineKeyboardButton(f"{icon} {idx + 1}. {task}", callback_data=f"task_{status}_{rowid}")])
+            buttons.append([InlineKeyboardButton(f"♻️ Restore '{task}'", callback_data=f"restore_{status}_{rowid}")])
+        pagination = get_pagination_row("history", tasks, has_prev, has_next)
+        if pagination:
+            buttons.append(pagination)
+        buttons.append([InlineKeyboardButton("🗑 Clear history", callback_data='clearhistory')])
         buttons.append([InlineKeyboardButton("🔙 Back to Menu", callback_data='back')])
         reply_markup = InlineKeyboardMarkup(buttons)
         message_text = f"{WELCOME_MESSAGE}\n\n📜 Your task history:"
@@ -144,14 +199,44 @@ async def taskhistory(update, context: CallbackContext, is_callback=False):
         else:
             await update.message.reply_text(message_text, disable_web_page_preview=True)
 
+async def search(update: Update, context: CallbackContext):
+    user_id = update.message.from_user.id
+    text = ' '.join(context.args)
+    if not text:
+        await update.message.reply_text("Please provide what to look for using /search <text>")
+        return
+    tasks = await context.bot_data["repo"].search_tasks(user_id, text, limit=PAGE_SIZE)
+    if tasks:
+        buttons = []
+        for rowid, task, status in tasks:
+            if status == "pending":
+                buttons.append([InlineKeyboardButton(f"📝 {task}", callback_data=f"task_{rowid}")])
+                buttons.append([
+                    InlineKeyboardButton("✅ Complete", callback_data=f"complete_{rowid}"),
+                    InlineKeyboardButton("❌ Remove", callback_data=f"remove_{rowid}"),
+                ])
+            else:
+                icon = "✅" if status == "completed" else "❌"
+                buttons.append([InlineKeyboardButton(f"{icon} {task}", callback_data=f"task_{status}_{rowid}")])
+                buttons.append([InlineKeyboardButton("♻️ Restore", callback_data=f"restore_{status}_{rowid}")])
+        buttons.append([InlineKeyboardButton("🔙 Back to Menu", callback_data='back')])
+        await update.message.reply_text(
+            f"🔎 Tasks matching '{text}':",
+            reply_markup=InlineKeyboardMarkup(buttons),
+            disable_web_page_preview=True
+        )
+    else:
+        await update.message.reply_text(f"No tasks match '{text}'.")
+
 async def help_command(update, context: CallbackContext, is_callback=False):
     help_text = (
         "Help\n\n"
         "Here are the available commands:\n"
         "/start - Start the bot and show the main menu\n"
-        "/addtask <task_name> - Add a new task\n"
+        "/addtask <task_name> - Add a new task (one task per line to add several)\n"
         "/viewtasks - View your pending tasks\n"
         "/taskhistory - View the task history\n"
+        "/search <text> - Find tasks by their text\n"
         "/help - Show this help message\n"
     )
     buttons = [[InlineKeyboardButton("🔙 Back to Menu", callback_data='back')]]
@@ -161,3 +246,20 @@ async def help_command(update, context: CallbackContext, is_callback=False):
         await update.edit_message_text(text=message_text, reply_markup=reply_markup, disable_web_page_preview=True)
     else:
         await update.message.reply_text(text=message_text, reply_markup=reply_markup, disable_web_page_preview=True)
+
+async def stats_command(update: Update, context: CallbackContext):
+    user_id = update.message.from_user.id
+    if user_id not in context.bot_data.get("admin_ids", ()):
+        return
+    lines = ["📊 Stats", "", "Handlers (count, p50 / p95 / p99 ms):"]
+    for label, (count, p50, p95, p99) in metrics.summary(metrics.handler_seconds).items():
+        lines.append(f"{label}: {count}, {p50 * 1000:.1f} / {p95 * 1000:.1f} / {p99 * 1000:.1f}")
+    lines += ["", "Queries (count, p50 / p95 / p99 ms):"]
+    for label, (count, p50, p95, p99) in metrics.summary(metrics.query_seconds).items():
+        lines.append(f"{label}: {count}, {p50 * 1000:.2f} / {p95 * 1000:.2f} / {p99 * 1000:.2f}")
+    for label, (count, p50, p95, p99) in metrics.summary(metrics.loop_lag_seconds).items():
+        lines += ["", f"Event loop lag p50 / p99: {p50 * 1000:.1f} / {p99 * 1000:.1f} ms"]
+    repo = context.bot_data["repo"]
+    lines += ["", f"Cache: {repo.cache.stats()}", f"Writes: {repo.batcher.stats()}"]
+    # Telegram caps messages at 4096 characters
+    await update.message.reply_text("\n".join(lines)[:4096])
@@ -1,9 +1,7 @@
 from telegram import InlineKeyboardButton
-from database import get_tasks
 
-def get_main_menu_keyboard(user_id):
-    tasks = get_tasks(user_id, status="pending")
-    if tasks:
+async def get_main_menu_keyboard(repo, user_id):
+    if await repo.has_tasks(user_id, "pending"):
         return [
             [InlineKeyboardButton("➕ Add Task", callback_data='addtask')],
             [InlineKeyboardButton("📝 View Tasks", callback_data='viewtasks')],
@@ -15,3 +13,11 @@ def get_main_menu_keyboard(user_id):
             [InlineKeyboardButton("➕ Add Task", callback_data='addtask')],
             [InlineKeyboardButton("ℹ️ Help", callback_data='help')]
         ]
+
+def get_pagination_row(view, rows, has_prev, has_next):
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton("◀ Prev", callback_data=f"page_{view}_b_{rows[0][0]}"))
+    if has_next:
+        buttons.append(InlineKeyboardButton("Next ▶", callback_data=f"page_{view}_a_{rows[-1][0]}"))
+    return buttons
@@ -0,0 +1,220 @@
+import asyncio
+import bisect
+import functools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, tuned for handlers and SQLite calls (~0.1 ms to 10 s)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 10000)
+
+# Seconds a metrics client gets to send its request line and headers
+HTTP_READ_TIMEOUT = 5.0
+
+# Label sets beyond this are folded into "other" so forged callback data
+# cannot blow up the number of series.
+MAX_LABELS = 200
+
+# Callback data prefixes the bot's own keyboards emit; anything else a client
+# sends is labelled "unknown".
+CALLBACK_PREFIXES = frozenset({
+    "addtask", "viewtasks", "back", "completeall", "clearhistory", "complete",
+    "remove", "restore", "page", "history", "help", "task",
+})
+
+
+def escape_label(value):
+    """Escape a label value for the Prometheus text format."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    """Prometheus-style histogram family keyed by a single label."""
+
+    def __init__(self, name, help, label, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                if len(self._series) >= MAX_LABELS:
+                    label_value = "other"
+                    series = self._series.get(label_value)
+                if series is None:
+                    series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {label: (list(counts), total, count) for label, (counts, total, count) in self._series.items()}
+
+    def quantile(self, counts, count, q):
+        """Estimate a quantile from bucket counts by linear interpolation."""
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        lower = 0.0
+        for upper, bucket_count in zip(self.buckets, counts):
+            if bucket_count and seen + bucket_count >= rank:
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+            lower = upper
+        return self.buckets[-1]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_value, (counts, total, count) in sorted(self.snapshot().items()):
+            label = f'{self.label}="{escape_label(label_value)}"'
+            cumulative = 0
+            for upper, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label},le="{upper}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label}}} {total}")
+            lines.append(f"{self.name}_count{{{label}}} {count}")
+        return lines
+
+
+class Metrics:
+    def __init__(self):
+        self.handler_seconds = Histogram(
+            "taskbot_handler_seconds", "Time spent handling an update.", "handler"
+        )
+        self.query_seconds = Histogram(
+            "taskbot_query_seconds", "Time spent in a database.py operation.", "operation"
+        )
+        self.query_rows = Histogram(
+            "taskbot_query_rows", "Rows returned or changed by a database.py operation.", "operation",
+            buckets=ROW_BUCKETS,
+        )
+        self.loop_lag_seconds = Histogram(
+            "taskbot_event_loop_lag_seconds", "How late the event loop ran a scheduled wakeup.", "loop"
+        )
+        self._counters = []
+
+    def register_counters(self, prefix, help, stats, gauges=()):
+        """Export the dict returned by ``stats()`` as ``<prefix>_<key>_total`` counters.
+
+        Keys listed in ``gauges`` are current values rather than running
+        totals and are exported as ``<prefix>_<key>`` gauges instead.
+        """
+        self._counters.append((prefix, help, stats, frozenset(gauges)))
+
+    def render(self):
+        lines = []
+        for histogram in (self.handler_seconds, self.query_seconds, self.query_rows, self.loop_lag_seconds):
+            lines.extend(histogram.render())
+        for prefix, help, stats, gauges in self._counters:
+            for key, value in stats().items():
+                kind = "gauge" if key in gauges else "counter"
+                name = f"{prefix}_{key}" if kind == "gauge" else f"{prefix}_{key}_total"
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self, histogram):
+        """Return ``{label: (count, p50, p95, p99)}`` for one histogram."""
+        return {
+            label: (count, *(histogram.quantile(counts, count, q) for q in (0.5, 0.95, 0.99)))
+            for label, (counts, _, count) in sorted(histogram.snapshot().items())
+        }
+
+
+metrics = Metrics()
+
+
+def handler_label(handler, update):
+    query = getattr(update, "callback_query", None)
+    if query is not None and query.data:
+        prefix = query.data.split("_", 1)[0]
+        return f"{handler.__name__}:{prefix if prefix in CALLBACK_PREFIXES else 'unknown'}"
+    return handler.__name__
+
+
+def instrument(handler):
+    """Record the latency of every call to a handler, split by callback prefix."""
+    @functools.wraps(handler)
+    async def wrapper(update, context):
+        began = time.perf_counter()
+        try:
+            return await handler(update, context)
+        finally:
+            metrics.handler_seconds.observe(handler_label(handler, update), time.perf_counter() - began)
+    return wrapper
+
+
+def row_count(result):
+    if isinstance(result, bool):
+        return int(result)
+    if isinstance(result, int):
+        return result
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple) and result and isinstance(result[0], list):
+        return len(result[0])
+    return 0
+
+
+def timed_query(func, conn, *args):
+    began = time.perf_counter()
+    result = func(conn, *args)
+    metrics.query_seconds.observe(func.__name__, time.perf_counter() - began)
+    metrics.query_rows.observe(func.__name__, row_count(result))
+    return result
+
+
+async def monitor_event_loop(interval=0.5):
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        metrics.loop_lag_seconds.observe("main", max(0.0, loop.time() - expected))
+
+
+async def _read_request_line(reader):
+    request_line = await reader.readline()
+    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+        pass
+    return request_line
+
+
+async def _handle_http(reader, writer):
+    try:
+        # Idle or slow clients are dropped instead of holding a connection open
+        request_line = await asyncio.wait_for(_read_request_line(reader), HTTP_READ_TIMEOUT)
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+            status, body = "200 OK", metrics.render().encode()
+        else:
+            status, body = "404 Not Found", b"Not Found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (ConnectionError, asyncio.TimeoutError, asyncio.LimitOverrunError, ValueError):
+        # ValueError is what readline() raises for lines over the stream limit
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_metrics(host, port):
+    """Serve the Prometheus text exposition on ``http://host:port/metrics``."""
+    server = await asyncio.start_server(_handle_http, host, port)
+    logger.info("Serving metrics on %s:%s", host, port)
+    return server
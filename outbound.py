@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import time
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Once more than MAX_IDLE_CHATS buckets exist, idle ones are dropped at most
+# every SWEEP_INTERVAL seconds
+MAX_IDLE_CHATS = 1024
+SWEEP_INTERVAL = 60.0
+
+
+class TokenBucket:
+    """Token bucket that hands out reservations instead of blocking."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+    def reserve(self):
+        """Take one token and return how many seconds to wait before using it."""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def idle(self):
+        now = time.monotonic()
+        return self._tokens + (now - self._updated) * self.rate >= self.burst
+
+
+class OutboundLimiter(BaseRateLimiter):
+    """Rate limiter for outgoing Bot API calls.
+
+    * Every request is throttled against an overall budget, and requests
+      with a ``chat_id`` also per chat (private chats and groups have
+      separate limits).
+    * A :exc:`telegram.error.RetryAfter` pauses all calls for the requested time,
+      after which the call is retried up to ``max_retries`` times.
+    """
+
+    def __init__(
+        self,
+        overall_max_rate=30,
+        chat_max_rate=1,
+        chat_burst=3,
+        group_max_rate=20 / 60,
+        group_burst=5,
+        max_retries=3,
+    ):
+        self._overall = TokenBucket(overall_max_rate, overall_max_rate)
+        self._chat_max_rate = chat_max_rate
+        self._chat_burst = chat_burst
+        self._group_max_rate = group_max_rate
+        self._group_burst = group_burst
+        self.max_retries = max_retries
+        self._chats = {}
+        self._next_sweep = 0.0
+        self._paused_until = 0.0
+        self.requests = 0
+        self.retries = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _chat_bucket(self, chat_id):
+        if len(self._chats) > MAX_IDLE_CHATS and time.monotonic() >= self._next_sweep:
+            self._next_sweep = time.monotonic() + SWEEP_INTERVAL
+            for key, bucket in list(self._chats.items()):
+                if bucket.idle():
+                    del self._chats[key]
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Negative ids (and @usernames) are groups and channels
+            if isinstance(chat_id, str) or chat_id < 0:
+                bucket = TokenBucket(self._group_max_rate, self._group_burst)
+            else:
+                bucket = TokenBucket(self._chat_max_rate, self._chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        # Calls aimed at a chat first wait for that chat's budget. The overall
+        # token is only taken right before each send, so calls released
+        # together by their chats cannot burst past the global limit.
+        chat_id = data.get("chat_id")
+        if chat_id is not None:
+            delay = self._chat_bucket(chat_id).reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        for attempt in range(self.max_retries + 1):
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            delay = self._overall.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                self.requests += 1
+                return await callback(*args, **kwargs)
+            except RetryAfter as exc:
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                logger.info("Rate limited by Telegram, retrying in %s seconds", exc.retry_after)
+                self._paused_until = max(self._paused_until, time.monotonic() + exc.retry_after + 0.1)
+
+    def stats(self):
+        return {"requests": self.requests, "retries": self.retries}
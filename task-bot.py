@@ -1,8 +1,12 @@
+import asyncio
 import os
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler
 from dotenv import load_dotenv
-from handlers import start, addtask, viewtasks, completetask, removetask, restoretask, taskhistory, help_command, button_callback
-from database import init_db
+from handlers import start, addtask, viewtasks, completetask, removetask, restoretask, taskhistory, help_command, button_callback, stats_command, search
+from database import TaskRepository
+from dispatch import per_user, user_locks
+from metrics import instrument, metrics, monitor_event_loop, serve_metrics
+from outbound import OutboundLimiter
 
 # Load environment variables from .env file
 load_dotenv()
@@ -14,21 +18,104 @@ TELEGRAM_API_TOKEN = os.getenv("TELEGRAM_API_TOKEN")
 if TELEGRAM_API_TOKEN is None:
     raise ValueError("TELEGRAM_API_TOKEN not found in environment variables")
 
-def main():
+# Per-user task cache limits (number of users kept, seconds before expiry)
+TASK_CACHE_SIZE = int(os.getenv("TASK_CACHE_SIZE", "1024"))
+TASK_CACHE_TTL = float(os.getenv("TASK_CACHE_TTL", "300"))
+
+# Group commit: flush queued writes after this many operations or milliseconds
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "64"))
+WRITE_BATCH_DELAY_MS = float(os.getenv("WRITE_BATCH_DELAY_MS", "5"))
+
+# Maximum number of updates processed at the same time (per user they stay in order)
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "64"))
+
+# Webhook mode is used when WEBHOOK_URL is set, long polling otherwise
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", os.getenv("PORT", "8443")))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN")
+
+# Without the secret anyone who finds the webhook URL can post forged updates
+if WEBHOOK_URL and WEBHOOK_SECRET_TOKEN is None:
+    raise ValueError("WEBHOOK_SECRET_TOKEN not found in environment variables (required with WEBHOOK_URL)")
+
+# Point the bot at another Bot API server, e.g. a local stand-in for testing
+# (http://127.0.0.1:8081). The token is appended to "<url>/bot", as with api.telegram.org.
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL")
+if TELEGRAM_API_BASE_URL and not TELEGRAM_API_BASE_URL.rstrip("/").endswith("/bot"):
+    TELEGRAM_API_BASE_URL = TELEGRAM_API_BASE_URL.rstrip("/") + "/bot"
+
+# Prometheus metrics endpoint, served on /metrics when METRICS_PORT is set
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+METRICS_PORT = os.getenv("METRICS_PORT")
+
+# Comma separated Telegram user ids allowed to use /stats
+ADMIN_USER_IDS = {int(user_id) for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id.strip()}
+
+async def post_init(application):
     # Initialize the database
-    init_db()
+    repo = application.bot_data["repo"]
+    await repo.init()
+
+    metrics.register_counters("taskbot_cache", "Task cache counters.", repo.cache.stats, gauges=("users",))
+    metrics.register_counters("taskbot_writes", "Write batcher counters.", repo.batcher.stats)
+    metrics.register_counters("taskbot_api", "Outbound Bot API counters.", application.bot.rate_limiter.stats)
+    metrics.register_counters("taskbot_dispatch", "Users with updates in flight.", lambda: {"active_users": user_locks.active}, gauges=("active_users",))
+    application.bot_data["loop_monitor"] = asyncio.create_task(monitor_event_loop())
+    if METRICS_PORT:
+        application.bot_data["metrics_server"] = await serve_metrics(METRICS_HOST, int(METRICS_PORT))
 
+async def post_shutdown(application):
+    application.bot_data["loop_monitor"].cancel()
+    if "metrics_server" in application.bot_data:
+        application.bot_data["metrics_server"].close()
+    await application.bot_data["repo"].close()
+
+def main():
     # Use the token obtained from the environment variable
-    application = Application.builder().token(TELEGRAM_API_TOKEN).build()
+    builder = (
+        Application.builder()
+        .token(TELEGRAM_API_TOKEN)
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .rate_limiter(OutboundLimiter())
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if TELEGRAM_API_BASE_URL:
+        builder = builder.base_url(TELEGRAM_API_BASE_URL)
+    application = builder.build()
+
+    # One repository (writer thread + reader pool) shared by all handlers
+    application.bot_data["admin_ids"] = ADMIN_USER_IDS
+    application.bot_data["repo"] = TaskRepository(
+        cache_size=TASK_CACHE_SIZE,
+        cache_ttl=TASK_CACHE_TTL,
+        batch_size=WRITE_BATCH_SIZE,
+        batch_delay=WRITE_BATCH_DELAY_MS / 1000,
+    )
 
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("addtask", addtask))
-    application.add_handler(CommandHandler("viewtasks", viewtasks))
-    application.add_handler(CommandHandler("taskhistory", taskhistory))
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CallbackQueryHandler(button_callback))
+    # instrument() is outermost so latency includes waiting for the user's lock
+    application.add_handler(CommandHandler("start", instrument(per_user(start))))
+    application.add_handler(CommandHandler("addtask", instrument(per_user(addtask))))
+    application.add_handler(CommandHandler("viewtasks", instrument(per_user(viewtasks))))
+    application.add_handler(CommandHandler("taskhistory", instrument(per_user(taskhistory))))
+    application.add_handler(CommandHandler("search", instrument(per_user(search))))
+    application.add_handler(CommandHandler("help", instrument(per_user(help_command))))
+    application.add_handler(CommandHandler("stats", instrument(stats_command)))
+    application.add_handler(CallbackQueryHandler(instrument(per_user(button_callback))))
 
-    application.run_polling(stop_signals=None)
+    if WEBHOOK_URL:
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET_TOKEN,
+            stop_signals=None,
+        )
+    else:
+        application.run_polling(stop_signals=None)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import sqlite3
+
+import pytest
+
+from batcher import WriteBatcher, apply_batch
+from database import TaskRepository, add_task, init_db
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / "tasks.db", isolation_level=None)
+    init_db(conn)
+    yield conn
+    conn.close()
+
+
+def fail(conn, user_id):
+    conn.execute("INSERT INTO tasks (user_id, task) VALUES (?, 'doomed')", (user_id,))
+    raise sqlite3.IntegrityError("boom")
+
+
+def recording_writer(conn, batches):
+    async def write(func, operations):
+        batches.append(len(operations))
+        return func(conn, operations)
+    return write
+
+
+def test_failing_operation_rolls_back_alone(conn):
+    results = apply_batch(conn, [(add_task, (1, "before")), (fail, (1,)), (add_task, (1, "after"))])
+    assert [ok for ok, _ in results] == [True, False, True]
+    assert isinstance(results[1][1], sqlite3.IntegrityError)
+    assert conn.execute("SELECT task FROM tasks ORDER BY id").fetchall() == [("before",), ("after",)]
+    assert not conn.in_transaction
+
+
+def test_flushes_on_max_batch_or_max_delay(conn):
+    async def scenario():
+        batches = []
+        batcher = WriteBatcher(recording_writer(conn, batches), max_batch=3, max_delay=0.05)
+        # Seven queued at once: two full batches, then the rest after max_delay
+        futures = [batcher.submit(add_task, 1, f"task {n}") for n in range(7)]
+        await asyncio.gather(*futures)
+        await batcher.close()
+        return batches, [future.result() for future in futures], batcher.stats()
+
+    batches, results, stats = asyncio.run(scenario())
+    assert batches == [3, 3, 1]
+    assert results == [1] * 7
+    assert stats == {"operations": 7, "transactions": 3}
+
+
+def test_close_drains_queue_and_rejects_new_writes(conn):
+    async def scenario():
+        batches = []
+        batcher = WriteBatcher(recording_writer(conn, batches), max_batch=64, max_delay=10)
+        futures = [batcher.submit(add_task, 1, f"task {n}") for n in range(5)]
+        await batcher.close()
+        with pytest.raises(RuntimeError):
+            batcher.submit(add_task, 1, "late")
+        return batches, futures
+
+    batches, futures = asyncio.run(scenario())
+    # close() does not wait out max_delay; everything queued is committed
+    assert batches == [5]
+    assert all(future.result() == 1 for future in futures)
+    assert conn.execute("SELECT count(*) FROM tasks").fetchone()[0] == 5
+
+
+def test_unwaited_write_failure_is_logged(tmp_path, caplog):
+    async def scenario():
+        repo = TaskRepository(tmp_path / "tasks.db", readers=1)
+        await repo.init()
+        try:
+            await repo._user_write(7, fail, wait=False)
+            await repo.add_task(7, "still works")
+        finally:
+            await repo.close()
+
+    with caplog.at_level(logging.ERROR, logger="database"):
+        asyncio.run(scenario())
+    assert [record.getMessage() for record in caplog.records] == ["Write for user 7 failed"]
+    assert isinstance(caplog.records[0].exc_info[1], sqlite3.IntegrityError)
@@ -0,0 +1,76 @@
+import pytest
+
+import cache
+from cache import TaskCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_read_racing_a_write_is_not_stored():
+    tasks = TaskCache()
+    token = tasks.token()
+    tasks.invalidate(1)  # a write for user 1 lands while the read is running
+    tasks.set(1, "page", "stale", token)
+    assert tasks.get(1, "page") is None
+
+    # Writes for other users do not stop user 1's reads from being cached
+    token = tasks.token()
+    tasks.invalidate(2)
+    tasks.set(1, "page", "fresh", token)
+    assert tasks.get(1, "page") == "fresh"
+
+
+def test_trimmed_invalidations_fall_back_to_floor():
+    tasks = TaskCache(max_users=1)
+    token = tasks.token()
+    for user_id in range(1, 6):
+        tasks.invalidate(user_id)
+    # User 1's invalidation was trimmed; the floor still rejects the race
+    assert 1 not in tasks._invalidated
+    assert tasks._floor > token
+    tasks.set(1, "page", "stale", token)
+    assert tasks.get(1, "page") is None
+    tasks.set(1, "page", "fresh", tasks.token())
+    assert tasks.get(1, "page") == "fresh"
+
+
+def test_least_recently_used_user_is_evicted():
+    tasks = TaskCache(max_users=2)
+    tasks.set(1, "page", "one", tasks.token())
+    tasks.set(2, "page", "two", tasks.token())
+    assert tasks.get(1, "page") == "one"  # user 2 is now the oldest
+    tasks.set(3, "page", "three", tasks.token())
+    assert tasks.get(2, "page") is None
+    assert tasks.get(1, "page") == "one"
+    assert tasks.get(3, "page") == "three"
+    assert tasks.stats() == {"hits": 3, "misses": 1, "users": 2}
+
+
+def test_entries_expire_after_ttl(clock):
+    tasks = TaskCache(ttl=10)
+    tasks.set(1, "page", "value", tasks.token())
+    clock[0] += 9.9
+    assert tasks.get(1, "page") == "value"
+    clock[0] += 0.2
+    assert tasks.get(1, "page") is None
+
+
+def test_entries_per_user_are_capped(clock):
+    tasks = TaskCache(ttl=10, max_entries=3)
+    for key in ("a", "b", "c"):
+        tasks.set(1, key, key, tasks.token())
+    tasks.get(1, "a")  # "b" is now the least recently used
+    tasks.set(1, "d", "d", tasks.token())
+    assert [key for key in "abcd" if tasks.get(1, key) is not None] == ["a", "c", "d"]
+
+    # Expired entries are swept before anything live is dropped
+    clock[0] += 5
+    tasks.set(1, "e", "e", tasks.token())  # drops "a", the oldest live entry
+    clock[0] += 6  # "c" and "d" have expired, "e" has not
+    tasks.set(1, "f", "f", tasks.token())
+    assert list(tasks._users[1]) == ["e", "f"]
@@ -0,0 +1,75 @@
+import sqlite3
+
+import pytest
+
+from database import (
+    add_task, add_tasks, delete_task, get_tasks_page, init_db, search_tasks, update_task_status,
+)
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / "tasks.db", isolation_level=None)
+    init_db(conn)
+    yield conn
+    conn.close()
+
+
+def test_search_only_returns_own_tasks(conn):
+    add_tasks(conn, 1, ["Buy milk", "Call mom"])
+    add_task(conn, 2, "Buy bread")
+    assert search_tasks(conn, 1, "bu") == [(1, "Buy milk", "pending")]
+    assert search_tasks(conn, 2, "bu") == [(3, "Buy bread", "pending")]
+    assert search_tasks(conn, 3, "bu") == []
+
+
+def test_search_treats_query_as_plain_words(conn):
+    add_task(conn, 1, 'say "hi" OR bye')
+    assert search_tasks(conn, 1, '"hi" OR') == [(1, 'say "hi" OR bye', "pending")]
+    assert search_tasks(conn, 1, "  *  ") == []
+
+
+def test_update_and_delete_report_rows_changed(conn):
+    add_task(conn, 1, "mine")
+    assert update_task_status(conn, 2, 1, "completed") == 0
+    assert update_task_status(conn, 1, 1, "completed") == 1
+    assert delete_task(conn, 2, 1) == 0
+    assert delete_task(conn, 1, 1) == 1
+    assert update_task_status(conn, 1, 1, "pending") == 0
+
+
+def test_get_tasks_page_walks_mixed_history_both_ways(conn):
+    # ids 1..20 cycling pending, completed, removed
+    statuses = ("pending", "completed", "removed")
+    for n in range(20):
+        add_task(conn, 1, f"task {n + 1}", statuses[n % 3])
+    add_task(conn, 2, "not mine", "completed")
+    history = ("completed", "removed")
+    expected = [task_id for task_id in range(1, 21) if task_id % 3 != 1]
+
+    pages = []
+    rows, has_prev, has_next = get_tasks_page(conn, 1, history, limit=4)
+    pages.append(rows)
+    assert (has_prev, has_next) == (False, True)
+    while has_next:
+        rows, has_prev, has_next = get_tasks_page(conn, 1, history, after_id=rows[-1][0], limit=4)
+        assert has_prev
+        pages.append(rows)
+    assert [row[0] for page in pages for row in page] == expected
+    assert [len(page) for page in pages] == [4, 4, 4, 1]
+    assert {row[2] for page in pages for row in page} == set(history)
+
+    # Back from the last page: same pages, rows still in ascending order
+    back = [rows]
+    while has_prev:
+        rows, has_prev, has_next = get_tasks_page(conn, 1, history, before_id=rows[0][0], limit=4)
+        assert has_next
+        back.append(rows)
+    assert back == pages[::-1]
+    assert (has_prev, has_next) == (False, True)
+
+
+def test_get_tasks_page_past_either_end_is_empty(conn):
+    add_tasks(conn, 1, ["a", "b"])
+    assert get_tasks_page(conn, 1, ("pending",), after_id=2) == ([], True, False)
+    assert get_tasks_page(conn, 1, ("pending",), before_id=1) == ([], False, True)
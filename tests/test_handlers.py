@@ -0,0 +1,47 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("telegram")
+
+from database import TaskRepository
+from handlers import taskhistory, viewtasks
+
+
+class FakeQuery:
+    def __init__(self, user_id):
+        self.from_user = SimpleNamespace(id=user_id)
+        self.edits = []
+
+    async def edit_message_text(self, text, reply_markup=None, **kwargs):
+        self.edits.append((text, reply_markup))
+
+
+def button_texts(reply_markup):
+    return [button.text for row in reply_markup.inline_keyboard for button in row]
+
+
+def test_emptied_page_falls_back_to_first_page(tmp_path):
+    async def scenario():
+        repo = TaskRepository(tmp_path / "tasks.db", readers=1)
+        await repo.init()
+        try:
+            await repo.add_tasks(1, ["first", "second"])
+            await repo.add_tasks(1, ["done"], status="completed")
+            context = SimpleNamespace(bot_data={"repo": repo})
+            query = FakeQuery(1)
+            # Cursors from a Next button whose tasks have since gone
+            await viewtasks(query, context, is_callback=True, after_id=2)
+            await taskhistory(query, context, is_callback=True, before_id=1)
+        finally:
+            await repo.close()
+        return query.edits
+
+    (pending_text, pending_markup), (history_text, history_markup) = asyncio.run(scenario())
+    assert pending_text == "📝 Your pending tasks:"
+    assert button_texts(pending_markup)[:6] == ["1. first", "✅ Complete", "❌ Remove", "2. second", "✅ Complete", "❌ Remove"]
+    assert "◀ Prev" not in button_texts(pending_markup)
+    assert "Your task history" in history_text
+    assert button_texts(history_markup)[0] == "✅ 1. done"
+    assert "Next ▶" not in button_texts(history_markup)
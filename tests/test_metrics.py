@@ -0,0 +1,78 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import metrics
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def request(port, payload):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(payload)
+        await writer.drain()
+        return await reader.read()
+    except ConnectionResetError:
+        # The server may hang up before reading everything we sent
+        return b""
+    finally:
+        writer.close()
+
+
+@pytest.fixture
+def short_timeout(monkeypatch):
+    monkeypatch.setattr(metrics, "HTTP_READ_TIMEOUT", 0.2)
+
+
+def test_metrics_endpoint(short_timeout):
+    async def scenario():
+        metrics.metrics.handler_seconds.observe("start", 0.01)
+        server = await metrics.serve_metrics("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            ok = await request(port, b"GET /metrics HTTP/1.1\r\nHost: x\r\n\r\n")
+            missing = await request(port, b"GET /other HTTP/1.1\r\n\r\n")
+            too_long = await request(port, b"GET /" + b"a" * 100_000 + b" HTTP/1.1\r\n\r\n")
+            # Sends nothing: must be disconnected after the read timeout
+            idle = await asyncio.wait_for(request(port, b""), 2)
+        finally:
+            server.close()
+            await server.wait_closed()
+        return ok, missing, too_long, idle
+
+    ok, missing, too_long, idle = run(scenario())
+    assert ok.startswith(b"HTTP/1.1 200 OK")
+    assert b'taskbot_handler_seconds_count{handler="start"}' in ok
+    assert missing.startswith(b"HTTP/1.1 404")
+    assert too_long == b""
+    assert idle == b""
+
+
+def test_forged_callback_data_cannot_inject_series():
+    async def button_callback(update, context):
+        pass
+
+    histogram = metrics.Histogram("test_seconds", "Test.", "handler")
+    forged = SimpleNamespace(callback_query=SimpleNamespace(data='x"} 1\nevil{a="'))
+    genuine = SimpleNamespace(callback_query=SimpleNamespace(data="complete_7"))
+    assert metrics.handler_label(button_callback, forged) == "button_callback:unknown"
+    assert metrics.handler_label(button_callback, genuine) == "button_callback:complete"
+
+    histogram.observe('a\\b"c\nd', 0.01)
+    lines = histogram.render()
+    assert 'test_seconds_count{handler="a\\\\b\\"c\\nd"} 1' in lines
+    assert not any(line.startswith("evil") or line.startswith("d\"") for line in lines)
+
+
+def test_running_totals_are_counters_and_current_values_gauges():
+    registry = metrics.Metrics()
+    registry.register_counters("test_cache", "Cache counters.", lambda: {"hits": 3, "users": 2}, gauges=("users",))
+    lines = registry.render().splitlines()
+    assert "# TYPE test_cache_hits_total counter" in lines
+    assert "test_cache_hits_total 3" in lines
+    assert "# TYPE test_cache_users gauge" in lines
+    assert "test_cache_users 2" in lines
@@ -0,0 +1,55 @@
+import sqlite3
+
+from database import MIGRATIONS, init_db
+
+
+def baseline_db(path):
+    # Schema and data as written by the original init_db()/add_task()/delete_task()
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS tasks (user_id INTEGER, task TEXT, status TEXT)")
+    conn.executemany(
+        "INSERT INTO tasks (user_id, task, status) VALUES (?, ?, ?)",
+        [(1, "first", "pending"), (1, "gone", "pending"), (2, "second", "completed"), (1, "third", "removed")],
+    )
+    conn.execute("DELETE FROM tasks WHERE task = 'gone'")
+    conn.commit()
+    rows = conn.execute("SELECT rowid, user_id, task, status FROM tasks ORDER BY rowid").fetchall()
+    conn.close()
+    return rows
+
+
+def schema(conn):
+    return conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY type, name").fetchall()
+
+
+def test_upgrade_baseline_database(tmp_path):
+    path = tmp_path / "tasks.db"
+    old_rows = baseline_db(path)
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    init_db(conn)
+
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS) == 3
+    assert conn.execute("SELECT id, user_id, task, status FROM tasks ORDER BY id").fetchall() == old_rows
+    assert conn.execute("SELECT count(*) FROM tasks WHERE created_at IS NULL OR updated_at IS NULL").fetchone()[0] == 0
+    assert conn.execute("SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH 'third'").fetchall() == [(4,)]
+
+    # New ids continue after the old rowids
+    conn.execute("INSERT INTO tasks (user_id, task) VALUES (1, 'new')")
+    assert conn.execute("SELECT max(id) FROM tasks").fetchone()[0] == 5
+    conn.execute("DELETE FROM tasks WHERE task = 'new'")
+
+    before = (schema(conn), conn.execute("SELECT * FROM tasks ORDER BY id").fetchall())
+    init_db(conn)
+    after = (schema(conn), conn.execute("SELECT * FROM tasks ORDER BY id").fetchall())
+    assert after == before
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 3
+    conn.close()
+
+
+def test_fresh_database(tmp_path):
+    conn = sqlite3.connect(tmp_path / "tasks.db", isolation_level=None)
+    init_db(conn)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 3
+    assert conn.execute("SELECT count(*) FROM tasks").fetchone()[0] == 0
+    conn.close()
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("telegram")
+
+from telegram.error import RetryAfter
+
+import outbound
+from outbound import OutboundLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake monotonic clock that asyncio.sleep() in outbound.py advances."""
+    now = [1000.0]
+
+    async def sleep(seconds):
+        now[0] += seconds
+
+    monkeypatch.setattr(outbound.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(outbound.asyncio, "sleep", sleep)
+    return now
+
+
+def send_times(limiter, clock, chat_ids):
+    sent = []
+
+    async def callback():
+        sent.append(clock[0])
+        return True
+
+    async def scenario():
+        for chat_id in chat_ids:
+            data = {} if chat_id is None else {"chat_id": chat_id}
+            await limiter.process_request(callback, (), {}, "sendMessage", data, None)
+
+    asyncio.run(scenario())
+    return [round(at - 1000.0, 6) for at in sent]
+
+
+def test_private_chat_bucket(clock):
+    limiter = OutboundLimiter(overall_max_rate=1000, chat_max_rate=1, chat_burst=3)
+    # Burst of three, then one per second; another chat has its own budget
+    assert send_times(limiter, clock, [1, 1, 1, 1, 1]) == [0, 0, 0, 1, 2]
+    assert send_times(limiter, clock, [2]) == [2]
+
+
+def test_group_bucket(clock):
+    limiter = OutboundLimiter(overall_max_rate=1000, group_max_rate=0.5, group_burst=2)
+    assert send_times(limiter, clock, [-100, -100, -100, "@channel"]) == [0, 0, 2, 2]
+
+
+def test_overall_bucket_applies_to_every_call(clock):
+    limiter = OutboundLimiter(overall_max_rate=2, chat_max_rate=1000, chat_burst=1000)
+    # The overall bucket starts with a burst of overall_max_rate tokens
+    assert send_times(limiter, clock, [None, 1, 2, None, 3]) == [0, 0, 0.5, 1.0, 1.5]
+
+
+def test_retry_after_pauses_and_retries(clock):
+    limiter = OutboundLimiter(max_retries=2)
+    attempts = []
+
+    async def flaky():
+        attempts.append(clock[0])
+        if len(attempts) == 1:
+            raise RetryAfter(5)
+        return "sent"
+
+    async def always_limited():
+        raise RetryAfter(1)
+
+    async def scenario():
+        result = await limiter.process_request(flaky, (), {}, "sendMessage", {"chat_id": 1}, None)
+        with pytest.raises(RetryAfter):
+            await limiter.process_request(always_limited, (), {}, "sendMessage", {"chat_id": 2}, None)
+        return result
+
+    assert asyncio.run(scenario()) == "sent"
+    assert round(attempts[1] - attempts[0], 6) == 5.1
+    assert limiter.stats() == {"requests": 5, "retries": 3}
+
+
+def test_idle_chats_are_swept_at_most_once_per_interval(clock, monkeypatch):
+    monkeypatch.setattr(outbound, "MAX_IDLE_CHATS", 2)
+    limiter = OutboundLimiter(chat_max_rate=1, chat_burst=1)
+    send_times(limiter, clock, [1, 2, 3])
+    clock[0] += 10  # every bucket is idle again
+    send_times(limiter, clock, [4])
+    assert sorted(limiter._chats) == [4]  # swept before adding chat 4
+    send_times(limiter, clock, [5, 6, 7])
+    assert sorted(limiter._chats) == [4, 5, 6, 7]  # no sweep until SWEEP_INTERVAL
+    clock[0] += outbound.SWEEP_INTERVAL
+    send_times(limiter, clock, [8])
+    assert sorted(limiter._chats) == [8]
@@ -0,0 +1,134 @@
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+
+pytest.importorskip("telegram")
+
+from bot_api_standin import BotApiStandIn
+
+SECRET = "s3cret-token"
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER = {"id": 42, "is_bot": False, "first_name": "Tester"}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return
+        time.sleep(0.05)
+    raise AssertionError("timed out")
+
+
+def listening(port):
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+            return True
+    except OSError:
+        return False
+
+
+def command(update_id, text):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": USER["id"], "type": "private"},
+            "from": USER,
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}],
+        },
+    }
+
+
+def callback(update_id, data):
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": USER,
+            "chat_instance": "1",
+            "data": data,
+            "message": {"message_id": 1, "date": 0, "chat": {"id": USER["id"], "type": "private"}, "text": "menu"},
+        },
+    }
+
+
+@pytest.fixture
+def standin():
+    server = BotApiStandIn().start()
+    yield server
+    server.stop()
+
+
+def test_webhook_mode_against_standin(standin, tmp_path):
+    port = free_port()
+    env = dict(
+        os.environ,
+        TELEGRAM_API_TOKEN="123:abc",
+        TELEGRAM_API_BASE_URL=standin.url,
+        WEBHOOK_URL=f"http://127.0.0.1:{port}",
+        WEBHOOK_LISTEN="127.0.0.1",
+        WEBHOOK_PORT=str(port),
+        WEBHOOK_SECRET_TOKEN=SECRET,
+    )
+    bot = subprocess.Popen([sys.executable, os.path.join(ROOT, "task-bot.py")], cwd=tmp_path, env=env)
+    try:
+        # setWebhook is sent before the listener is up, so wait for the port itself
+        wait_for(lambda: listening(port))
+
+        def post(update):
+            request = urllib.request.Request(
+                f"http://127.0.0.1:{port}/telegram",
+                data=json.dumps(update).encode(),
+                headers={"Content-Type": "application/json", "X-Telegram-Bot-Api-Secret-Token": SECRET},
+            )
+            urllib.request.urlopen(request).read()
+
+        post(command(1, "/addtask Buy milk"))
+        wait_for(lambda: standin.methods().count("sendMessage") == 1)
+        post(callback(2, "complete_1"))
+        wait_for(lambda: standin.methods().count("editMessageText") == 1)
+        # A stale button for a task that is not there
+        post(callback(3, "restore_removed_99"))
+        wait_for(lambda: standin.methods().count("editMessageText") == 2)
+    finally:
+        bot.terminate()
+        bot.wait(10)
+
+    edits = [params["text"] for method, params in standin.calls if method == "editMessageText"]
+    assert "Task marked as completed" in edits[0]
+    assert "That task no longer exists" in edits[1]
+    with sqlite3.connect(tmp_path / "tasks.db") as conn:
+        assert conn.execute("SELECT id, user_id, task, status FROM tasks").fetchall() == [
+            (1, 42, "Buy milk", "completed")
+        ]
+
+
+def test_webhook_requires_secret_token(standin, tmp_path):
+    env = dict(
+        os.environ,
+        TELEGRAM_API_TOKEN="123:abc",
+        TELEGRAM_API_BASE_URL=standin.url,
+        WEBHOOK_URL="http://127.0.0.1:1",
+    )
+    env.pop("WEBHOOK_SECRET_TOKEN", None)
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "task-bot.py")], cwd=tmp_path, env=env, capture_output=True, timeout=30
+    )
+    assert result.returncode != 0
+    assert b"WEBHOOK_SECRET_TOKEN" in result.stderr